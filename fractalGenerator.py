@@ -1,8 +1,13 @@
 from cmath import log 
 import math 
+import os
+import struct
+import zlib
 import numpy as np 
 import time
-from numba import jit
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from numba import jit, prange
 from PIL import Image 
 import matplotlib.pyplot as plt
 from sympy import Poly, symbols, sympify
@@ -67,6 +72,59 @@ colorInterpolations = {
     "Gamma 4": lambda x,m :gamma(x,m, 4)  }
 
 
+#the radius beyond which a point is considered to diverge.
+ESCAPE_RADIUS = 5
+#the distance estimates are colored on a log-scale, from ESCAPE_RADIUS down to ESCAPE_RADIUS*exp(-DISTANCE_RANGE).
+#fixed constants, so that the colors don't depend on the view (e.g. neighbouring tiles or previews agree).
+DISTANCE_RANGE = 20.0
+
+#the channels that the kernel can fill into the result buffer (see get_fractal_set), and their types.
+#smooth: the smooth iteration count divided by maxiter, final_z: the last point of the orbit,
+#derivative: |dz/dz0| of the last point, trap: the minimal distance of the orbit to the origin. 
+CHANNELS = ("smooth", "final_z", "derivative", "trap")
+channelTypes = {
+    "smooth": np.float64,
+    "final_z": np.complex128,
+    "derivative": np.float64,
+    "trap": np.float64 }
+
+## Coloring modes, that map the channels of the result buffer to values between 0 and 1, 
+## which are then rescaled by the color interpolation functions. 
+def smooth(result, maxiter):
+    return result["smooth"]
+def angle(result, maxiter):
+    return np.angle(result["final_z"])/(2*math.pi) + 0.5
+def binary_decomposition(result, maxiter):
+    z = result["final_z"]
+    escaped = np.abs(z) > ESCAPE_RADIUS
+    return np.where(escaped, np.where(z.imag > 0, 1.0, 0.5), 0.0)
+def distance_estimate(result, maxiter):
+    z = np.abs(result["final_z"])
+    with np.errstate(all="ignore"):
+        de = z*np.log(z)/result["derivative"]
+    escaped = (z > ESCAPE_RADIUS) & np.isfinite(de) & (de > 0)
+    values = np.zeros(z.shape)
+    #points close to the boundary get the largest values.
+    values[escaped] = np.clip(-np.log(de[escaped]/ESCAPE_RADIUS)/DISTANCE_RANGE, 0, 1)
+    return values 
+def orbit_trap(result, maxiter):
+    return np.clip(result["trap"]/ESCAPE_RADIUS, 0, 1)
+
+#dict. for the coloring modes, and the channels each of them needs. 
+colorModes = {
+    "Smooth": smooth,
+    "Angle": angle,
+    "Binary decomposition": binary_decomposition,
+    "Distance estimate": distance_estimate,
+    "Orbit trap": orbit_trap }
+colorModeChannels = {
+    "Smooth": ("smooth",),
+    "Angle": ("final_z",),
+    "Binary decomposition": ("final_z",),
+    "Distance estimate": ("final_z", "derivative"),
+    "Orbit trap": ("trap",) }
+
+
 
 def get_poly_matrix(expression:str):
     """parses the given string into a polynomial and extracts the coefficient matrix.
@@ -87,34 +145,61 @@ def get_poly_matrix(expression:str):
     
     coefmatrix = [ Poly(coef,c).all_coeffs() for coef in poly.all_coeffs() ]
     coefmatrix = [ [ x.subs(H,0) for x in col ] for col in coefmatrix]
-    return np.array( coefmatrix , dtype = np.complex ) 
+    return np.array( coefmatrix , dtype = complex ) 
 
 
-def get_fractal_set(function:str,xmin:float,xmax:float,ymin:float,ymax:float,\
-    width:int,height: int ,maxiter:int ) : 
-    """
-    The main function, that takes in the specifications of the fractal.
-    Returns a tuple of (set, time) where set is a numpy array of shape (width,height) 
-    with values between 0 and 1, and time is the time it took to generate the fractal. 
-    """
-    coefmatrix = get_poly_matrix(function)
-    zdeg, cdeg = coefmatrix.shape 
-    B = 5 #2**(1/(zdeg-2)) #B controls the divergence check; essentially needs to be picked large enough. 
-    #for normal mandelbrot, the typical value is B=2. 
+#cache of compiled kernels, keyed by the normalized expression, so that repeated renders 
+#of the same formula (e.g. map tiles, or zooming in the GUI) don't pay the jit-compilation again.
+#the least recently used kernels are dropped when there are more than MAX_KERNELS.
+MAX_KERNELS = 32
+_kernels = OrderedDict()
+_channel_kernels = OrderedDict()
 
-    convergence_lim=B**2 
-    logzdeg = log(zdeg-1)
-    logB = log(B)
+def _normalize_function(function:str):
+    """The canonical form of the expression, so that e.g. 'z**2+c' and 'z**2 + c' share their kernels.
+    Only used as the cache key: sympy may print names (like sqrt) that the jit-functions don't know."""
+    return str(sympify(function))
+
+def _cached_kernel(cache, key):
+    kernel = cache.get(key)
+    if kernel is not None:
+        cache.move_to_end(key)
+    return kernel 
+
+def _cache_kernel(cache, key, kernel):
+    cache[key] = kernel 
+    while len(cache) > MAX_KERNELS:
+        cache.popitem(last=False)
+    return kernel 
+
+def _jit_expression(expression):
+    """Parses the given expression (a string or sympy expression in z and c) into a jit-function f(z,c)."""
+    lambdastr=f'lambda z,c:'+str(expression).replace("I",'complex(0,1)')
+    lambdafunc = eval(lambdastr)
+    return jit(nopython=True)(lambdafunc)
+
+def get_kernel(function:str):
+    """Parses the given expression into a jit-function, and compiles the functions that 
+    compute the divergence of the points in a lattice. The compiled kernel is cached per expression.
     
+    returns the tuple of jit-functions (fractal_set, fractal_atlas), where
+    fractal_set(xmin,xmax,ymin,ymax,width,height,maxiter,convergence_lim,logB,logzdeg,mirror,julia,c0)
+    computes the lattice, skipping the rows j with mirror[j] >= 0 (see mirror_rows). If julia is True, 
+    c is fixed to c0 and z ranges over the lattice, otherwise c = z as for the Mandelbrot set.
+    fractal_atlas(cs,xmin,xmax,ymin,ymax,width,height,maxiter,convergence_lim,logB,logzdeg) computes
+    the Julia sets for the 2d-array of parameters cs in parallel, see get_julia_atlas. 
+    """
+    key = _normalize_function(function)
+    kernel = _cached_kernel(_kernels, key)
+    if kernel is not None:
+        return kernel 
+
     #parsing the given expression into a jit-function.
-    lambdastr=f'lambda z,c:'+function.replace("I",'complex(0,1)')
-    lambdafunc = eval(lambdastr)
-    func = jit(nopython=True)(lambdafunc)
+    func = _jit_expression(function)
 
     #the function that computes the divergence of a point. 
     @jit(nopython=True)
-    def fractal_test(z:complex):
-        c = z 
+    def fractal_test(z:complex, c:complex, maxiter, convergence_lim, logB, logzdeg):
         for n in range(maxiter):
             if z.real*z.real + z.imag*z.imag > convergence_lim: 
                 sn = n - log( log (abs(z))/logB)/logzdeg
@@ -124,22 +209,226 @@ def get_fractal_set(function:str,xmin:float,xmax:float,ymin:float,ymax:float,\
         return (maxiter- log( log (abs(z))/logB)/logzdeg).real
     
     ##the function that loops over the lattice points, using the above function to compute the divergence for each one.
-    @timeit
-    @jit(nopython=True)
-    def fractal_set():
+    ##releases the GIL, so that the GUI stays responsive while rendering in a background thread. 
+    @jit(nopython=True, nogil=True)
+    def fractal_set(xmin, xmax, ymin, ymax, width, height, maxiter, convergence_lim, logB, logzdeg, mirror, julia, c0):
         r1 = np.linspace(xmin, xmax, width)
         r2 = np.linspace(ymin, ymax, height)
-        fractal_set = [fractal_test(complex(r, i)) for r in r1 for i in r2]
+        fractal_set = np.empty((width, height))
+        for i in range(width):
+            for j in range(height):
+                if mirror[j] >= 0:
+                    continue 
+                z = complex(r1[i], r2[j])
+                fractal_set[i,j] = fractal_test(z, c0 if julia else z, maxiter, convergence_lim, logB, logzdeg)
         return fractal_set 
+
+    ##the Julia sets for many parameters, one thumbnail per parallel task, written into one atlas-array.
+    @jit(nopython=True, nogil=True, parallel=True)
+    def fractal_atlas(cs, xmin, xmax, ymin, ymax, width, height, maxiter, convergence_lim, logB, logzdeg):
+        r1 = np.linspace(xmin, xmax, width)
+        r2 = np.linspace(ymin, ymax, height)
+        ncols, nrows = cs.shape 
+        atlas = np.empty((ncols*width, nrows*height))
+        for k in prange(ncols*nrows):
+            ci = k // nrows 
+            cj = k % nrows 
+            c = cs[ci, cj]
+            for i in range(width):
+                for j in range(height):
+                    atlas[ci*width + i, cj*height + j] = fractal_test(complex(r1[i], r2[j]), c, maxiter, 
+                                                                      convergence_lim, logB, logzdeg)
+        return atlas 
+
+    return _cache_kernel(_kernels, key, (fractal_set, fractal_atlas))
+
+def get_channel_kernel(function:str):
+    """Like get_kernel, but compiles the kernel that fills the result buffer with the requested channels. 
+    
+    returns the jit-function fractal_channels(xmin,xmax,ymin,ymax,width,height,maxiter,convergence_lim,
+    logB,logzdeg,mirror,julia,c0,out,ismooth,ifinal,ideriv,itrap), where out is a float array of shape (width,height,n)
+    and the i-arguments are the positions of the channels in the last axis of out (-1 if not requested).
+    """
+    key = _normalize_function(function)
+    kernel = _cached_kernel(_channel_kernels, key)
+    if kernel is not None:
+        return kernel 
+
+    z,c = symbols('z c')
+    expression = sympify(function)
+    func = _jit_expression(function)
+    #the partial derivatives, for the derivative with respect to the starting point z0 (and c=z0 if not julia). 
+    #evaluated to floats, so that they're printed without names like sqrt. 
+    dfunc_z = _jit_expression(expression.diff(z).evalf(17))
+    dfunc_c = _jit_expression(expression.diff(c).evalf(17))
+
+    @jit(nopython=True, nogil=True)
+    def fractal_channels(xmin, xmax, ymin, ymax, width, height, maxiter, convergence_lim, logB, logzdeg,
+                         mirror, julia, c0, out, ismooth, ifinal, ideriv, itrap):
+        r1 = np.linspace(xmin, xmax, width)
+        r2 = np.linspace(ymin, ymax, height)
+        for i in range(width):
+            for j in range(height):
+                if mirror[j] >= 0:
+                    continue 
+                z = complex(r1[i], r2[j])
+                c = c0 if julia else z 
+                dz = complex(1,0)
+                trap = abs(z)
+                n = 0 
+                while n < maxiter and z.real*z.real + z.imag*z.imag <= convergence_lim:
+                    if ideriv >= 0:
+                        if julia:
+                            dz = dfunc_z(z,c)*dz 
+                        else:
+                            dz = dfunc_z(z,c)*dz + dfunc_c(z,c)
+                    z = func(z,c)
+                    if itrap >= 0:
+                        trap = min(trap, abs(z))
+                    n += 1 
+
+                if ismooth >= 0:
+                    out[i,j,ismooth] = (n - log( log (abs(z))/logB)/logzdeg).real/maxiter
+                if ifinal >= 0:
+                    out[i,j,ifinal] = z.real
+                    out[i,j,ifinal+1] = z.imag
+                if ideriv >= 0:
+                    out[i,j,ideriv] = abs(dz)
+                if itrap >= 0:
+                    out[i,j,itrap] = trap
+        return out 
+
+    return _cache_kernel(_channel_kernels, key, fractal_channels)
+
+def is_real_symmetric(coefmatrix):
+    """If all the coefficients of the polynomial are real, f(conj(z),conj(c)) = conj(f(z,c)),
+    so the orbit of conj(c) is the mirror image of the orbit of c, and the set is symmetric about the real axis."""
+    return bool(np.all(coefmatrix.imag == 0))
+
+def snap_to_axis(ymin:float, ymax:float, height:int):
+    """For views straddling the real axis, shifts the lattice rows by at most a quarter of a pixel, so that 
+    the mirror images of the rows on one side of the axis land exactly on rows on the other side.
+    (y_j = ymin + j*step has its mirror image on the lattice when 2*ymin/step is an integer.)
+    Returns the shifted (ymin, ymax)."""
+    if height < 2 or ymin == ymax or not (min(ymin,ymax) < 0 < max(ymin,ymax)):
+        return ymin, ymax 
+    step = (ymax-ymin)/(height-1)
+    shift = round(2*ymin/step)*step/2 - ymin 
+    return ymin + shift, ymax + shift 
+
+def mirror_rows(ymin:float, ymax:float, height:int):
+    """For every row j of the lattice (with imaginary part y_j) below the real axis, finds the row k with y_k = -y_j,
+    if the lattice has one. Returns an int array where mirror[j] = k for these rows, and -1 for the rows that
+    have to be computed. When the view is centered on the real axis, this is about half of the rows, when it's 
+    not centered, the rows whose mirror image is inside the view (after snap_to_axis) are mirrored."""
+    mirror = np.full(height, -1)
+    if height < 2 or ymin == ymax:
+        return mirror 
+    r2 = np.linspace(ymin, ymax, height)
+    step = (ymax-ymin)/(height-1)
+    for j in np.nonzero(r2 < 0)[0]:
+        k = int(round((-r2[j]-ymin)/step))
+        #only mirror when -y_j is on the lattice up to a tiny fraction of a pixel.
+        if 0 <= k < height and abs(r2[k] + r2[j]) <= 1e-6*abs(step):
+            mirror[j] = k 
+    return mirror 
+
+def fill_mirrored(set, mirror):
+    """Fills the rows of the set that were skipped by the kernel with the mirror images of the computed rows."""
+    rows = np.nonzero(mirror >= 0)[0]
+    if len(rows) == 0:
+        return set 
+    set[:,rows] = set[:,mirror[rows]]
+    if set.dtype.names is not None and "final_z" in set.dtype.names:
+        set["final_z"][:,rows] = np.conj(set["final_z"][:,rows])
+    return set 
+
+def channel_dtype(channels):
+    """The structured dtype of a result buffer holding the given channels (in the order of CHANNELS)."""
+    return np.dtype([ (name, channelTypes[name]) for name in CHANNELS if name in channels ])
+
+
+def _escape_constants(coefmatrix):
+    """The constants (convergence_lim, logB, logzdeg) used by the kernels for the divergence check
+    and the smooth iteration count."""
+    zdeg, cdeg = coefmatrix.shape 
+    B = ESCAPE_RADIUS #2**(1/(zdeg-2)) #B controls the divergence check; essentially needs to be picked large enough. 
+    #for normal mandelbrot, the typical value is B=2. 
+
+    convergence_lim=B**2 
+    logzdeg = log(zdeg-1)
+    logB = log(B)
+    return convergence_lim, logB, logzdeg
+
+
+def get_fractal_set(function:str,xmin:float,xmax:float,ymin:float,ymax:float,\
+    width:int,height: int ,maxiter:int, channels=None, julia:complex=None ) : 
+    """
+    The main function, that takes in the specifications of the fractal.
+    Returns a tuple of (set, time) where set is a numpy array of shape (width,height) 
+    with values between 0 and 1, and time is the time it took to generate the fractal. 
+
+    If channels (a list of names from CHANNELS) is given, set is instead a structured array
+    of shape (width,height) with one field per channel, which rescale can color in different ways
+    without rerunning the generation. The 'smooth' channel is the array described above.
+
+    If julia is given, the Julia set of the parameter c=julia is computed instead, i.e. c is fixed
+    and the starting point z ranges over the lattice. 
+
+    For polynomials with real coefficients (and a real julia parameter), only the points on one side 
+    of the real axis are computed, and the rest of the set is filled with their mirror image. For views 
+    that aren't centered on the axis, the lattice is shifted by up to a quarter of a pixel for this. 
+    """
+    coefmatrix = get_poly_matrix(function)
+    convergence_lim, logB, logzdeg = _escape_constants(coefmatrix)
+    c0 = complex(0,0) if julia is None else complex(julia)
+
+    if is_real_symmetric(coefmatrix) and c0.imag == 0:
+        ymin, ymax = snap_to_axis(ymin, ymax, height)
+        mirror = mirror_rows(ymin, ymax, height)
+    else:
+        mirror = np.full(height, -1)
     
-    set,time = fractal_set()
-    #convert to a np.array and reshape into proper dimensions for generating an image
-    set = np.array(set).reshape((width, height))
-    set = set/maxiter
+    if channels is not None:
+        dtype = channel_dtype(channels)
+        #the positions of the channels in a float64-buffer with the same memory layout as the structured array. 
+        index = [ dtype.fields[name][1]//8 if name in dtype.names else -1 for name in CHANNELS ]
+        out = np.empty((width, height, dtype.itemsize//8))
+        fractal_channels = timeit(get_channel_kernel(function))
+        out,time = fractal_channels(xmin, xmax, ymin, ymax, width, height, maxiter, convergence_lim, logB, logzdeg,
+                                    mirror, julia is not None, c0, out, *index)
+        return fill_mirrored(out.view(dtype)[...,0], mirror), time
+
+    fractal_set = timeit(get_kernel(function)[0])
+    set,time = fractal_set(xmin, xmax, ymin, ymax, width, height, maxiter, convergence_lim, logB, logzdeg, 
+                           mirror, julia is not None, c0)
+    set = fill_mirrored(set, mirror)/maxiter
 
     return set,time
 
 
+def get_julia_atlas(function:str, cxmin:float, cxmax:float, cymin:float, cymax:float, ncols:int, nrows:int,\
+    xmin:float,xmax:float,ymin:float,ymax:float, width:int, height:int, maxiter:int):
+    """
+    Renders an atlas of small Julia sets, one for each parameter c on the ncols x nrows grid spanning
+    (cxmin,cxmax) x (cymin,cymax), with z ranging over (xmin,xmax) x (ymin,ymax) in each thumbnail. 
+    All thumbnails are computed in one parallel kernel, so the compilation and dispatch is only paid once. 
+    Returns a tuple of (atlas, time), where atlas is a numpy array of shape (ncols*width, nrows*height)
+    with values between 0 and 1, laid out like the parameter plane, so that it can be rescaled and saved 
+    as one image like the sets from get_fractal_set. The thumbnail of the parameter 
+    c = (cx[i], cy[j]) is atlas[i*width:(i+1)*width, j*height:(j+1)*height]. 
+    """
+    coefmatrix = get_poly_matrix(function)
+    convergence_lim, logB, logzdeg = _escape_constants(coefmatrix)
+
+    cx = np.linspace(cxmin, cxmax, ncols)
+    cy = np.linspace(cymin, cymax, nrows)
+    cs = cx[:,None] + 1j*cy[None,:]
+
+    fractal_atlas = timeit(get_kernel(function)[1])
+    atlas,time = fractal_atlas(cs, xmin, xmax, ymin, ymax, width, height, maxiter, convergence_lim, logB, logzdeg)
+    return atlas/maxiter, time
+
 
 #the mandelbrot functions that I started with. 
 # @jit
@@ -166,13 +455,163 @@ def get_fractal_set(function:str,xmin:float,xmax:float,ymin:float,ymax:float,\
 #     return man/maxiter 
 
 
-def rescale(set: np.array,maxiter:int, interpolation:str):
-    """Rescales the array representing the fractal according to the specified interpolation."""
+def rescale(set: np.array,maxiter:int, interpolation:str, mode:str="Smooth"):
+    """Rescales the array representing the fractal according to the specified interpolation.
+    If the set is a result buffer with several channels, it's first colored with the given coloring mode."""
+    if set.dtype.names is not None:
+        set = colorModes[mode](set,maxiter)
     return colorInterpolations[interpolation](set,maxiter)
 
-def save_image(set, filename:str, color:str):
-    """Saves the given set as an image with the given filename, using the specified colormap to map 
-    the array (with values between 0 and 1) to a nice color gradient. """
+#number of image rows colorized/encoded per task, and number of threads used for it. 
+CHUNK_ROWS = 128
+IMAGE_WORKERS = os.cpu_count() or 1
+
+def _map_chunks(f, n:int, workers:int):
+    """Applies f to the row-ranges (start,stop) covering n rows, in a thread pool if there are several. 
+    The heavy parts (colormap lookups, zlib) release the GIL, so the threads run in parallel."""
+    chunks = [ (start, min(start+CHUNK_ROWS, n)) for start in range(0, n, CHUNK_ROWS) ]
+    if workers <= 1 or len(chunks) <= 1:
+        return [ f(*chunk) for chunk in chunks ]
+    with ThreadPoolExecutor(min(workers, len(chunks))) as pool:
+        return list(pool.map(lambda chunk: f(*chunk), chunks))
+
+def colorize(set, color:str, workers:int=None):
+    """Maps the given set (with values between 0 and 1) to a nice color gradient using the specified colormap. 
+    Returns an RGB uint8-array of shape (height,width,3), with the first row at the top of the image. 
+    The set is read through a rotated view, so the image doesn't have to be transposed afterwards."""
     colormap = colorschemes[color]
-    img = Image.fromarray( np.uint8(colormap(set)*255)).transpose(Image.ROTATE_90)
-    img.save(filename+".png",format="png")
\ No newline at end of file
+    #set[i,j] is the point (x_i,y_j), with y increasing, so the rows of the image are the reversed columns. 
+    rotated = set.T[::-1]
+    height, width = rotated.shape 
+    rgb = np.empty((height, width, 3), dtype=np.uint8)
+    def colorize_rows(start, stop):
+        rgb[start:stop] = colormap(rotated[start:stop], bytes=True)[...,:3]
+    _map_chunks(colorize_rows, height, workers or IMAGE_WORKERS)
+    return rgb 
+
+def _png_chunk(data, name:bytes):
+    return struct.pack(">I", len(data)) + name + data + struct.pack(">I", zlib.crc32(name + data))
+
+def _adler32_combine(adler1:int, adler2:int, len2:int):
+    """The adler32-checksum of the concatenation of two buffers, from the checksums of the buffers."""
+    BASE = 65521 
+    rem = len2 % BASE 
+    sum1 = adler1 & 0xffff 
+    sum2 = (rem*sum1) % BASE 
+    sum1 += (adler2 & 0xffff) + BASE - 1 
+    sum2 += (adler1 >> 16) + (adler2 >> 16) + BASE - rem 
+    return ((sum2 % BASE) << 16) | (sum1 % BASE)
+
+def encode_png(rgb, compress_level:int=6, workers:int=None):
+    """Encodes the RGB-array as a png, returning the bytes. The rows are filtered and deflated in chunks 
+    in parallel, and the chunks joined into one zlib-stream with sync-flushes (like pigz does).
+    Lower compress_level (0-9) is faster, but gives larger files."""
+    height, width, _ = rgb.shape 
+    def compress_rows(start, stop):
+        #the 'Sub' png-filter: every byte minus the byte of the pixel to the left (mod 256). 
+        rows = rgb[start:stop]
+        filtered = np.empty((stop-start, 1 + 3*width), dtype=np.uint8)
+        filtered[:,0] = 1 
+        filtered[:,1:4] = rows[:,0]
+        filtered[:,4:] = (rows[:,1:] - rows[:,:-1]).reshape(stop-start, -1)
+        compressor = zlib.compressobj(compress_level, zlib.DEFLATED, -15)
+        last = stop == height 
+        data = compressor.compress(filtered) + compressor.flush(zlib.Z_FINISH if last else zlib.Z_SYNC_FLUSH)
+        return data, zlib.adler32(filtered), filtered.size 
+    chunks = _map_chunks(compress_rows, height, workers or IMAGE_WORKERS)
+
+    adler = 1 
+    for data, chunk_adler, length in chunks:
+        adler = _adler32_combine(adler, chunk_adler, length)
+    idat = b"\x78\x9c" + b"".join(data for data, _, _ in chunks) + struct.pack(">I", adler)
+
+    header = struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)
+    return b"\x89PNG\r\n\x1a\n" + _png_chunk(header, b"IHDR") + _png_chunk(idat, b"IDAT") + _png_chunk(b"", b"IEND")
+
+@jit(nopython=True)
+def _qoi_encode_pixels(pixels):
+    """Encodes the (n,3) array of RGB-pixels with the operations of the QOI format, returns the bytes as an array."""
+    out = np.empty(4*pixels.shape[0] + 8, dtype=np.uint8)
+    #the index of previously seen pixels. The decoder starts with (0,0,0,0), i.e. with alpha 0, which 
+    #none of our pixels match, so start with -1 here, which no pixel matches either.
+    index = np.full((64,3), -1, dtype=np.int64)
+    pos = 0 
+    run = 0 
+    pr, pg, pb = 0, 0, 0 
+    n = pixels.shape[0]
+    for k in range(n):
+        r, g, b = int(pixels[k,0]), int(pixels[k,1]), int(pixels[k,2])
+        if r == pr and g == pg and b == pb:
+            run += 1 
+            if run == 62 or k == n-1:
+                out[pos] = 0xc0 | (run-1)
+                pos += 1 
+                run = 0 
+            continue 
+        if run > 0:
+            out[pos] = 0xc0 | (run-1)
+            pos += 1 
+            run = 0 
+        #the alpha is always 255 here.
+        h = (r*3 + g*5 + b*7 + 255*11) % 64 
+        if index[h,0] == r and index[h,1] == g and index[h,2] == b:
+            out[pos] = h 
+            pos += 1 
+        else:
+            index[h,0], index[h,1], index[h,2] = r, g, b 
+            vr = (r - pr + 128) % 256 - 128 
+            vg = (g - pg + 128) % 256 - 128 
+            vb = (b - pb + 128) % 256 - 128 
+            vg_r = vr - vg 
+            vg_b = vb - vg 
+            if -2 <= vr <= 1 and -2 <= vg <= 1 and -2 <= vb <= 1:
+                out[pos] = 0x40 | (vr+2) << 4 | (vg+2) << 2 | (vb+2)
+                pos += 1 
+            elif -8 <= vg_r <= 7 and -32 <= vg <= 31 and -8 <= vg_b <= 7:
+                out[pos] = 0x80 | (vg+32)
+                out[pos+1] = (vg_r+8) << 4 | (vg_b+8)
+                pos += 2 
+            else:
+                out[pos] = 0xfe 
+                out[pos+1], out[pos+2], out[pos+3] = r, g, b 
+                pos += 4 
+        pr, pg, pb = r, g, b 
+    #end marker
+    for k in range(7):
+        out[pos+k] = 0 
+    out[pos+7] = 1 
+    return out[:pos+8]
+
+def encode_qoi(rgb):
+    """Encodes the RGB-array in the QOI format, which is much faster to encode than png, and 
+    useful for intermediate frames."""
+    height, width, _ = rgb.shape 
+    header = b"qoif" + struct.pack(">IIBB", width, height, 3, 0)
+    return header + _qoi_encode_pixels(rgb.reshape(-1,3)).tobytes()
+
+## Functions writing an RGB-array to a file in the different formats, the extension is added to the filename. 
+def write_png(rgb, filename:str, compress_level:int):
+    with open(filename+".png", "wb") as f:
+        f.write(encode_png(rgb, compress_level))
+def write_qoi(rgb, filename:str, compress_level:int):
+    with open(filename+".qoi", "wb") as f:
+        f.write(encode_qoi(rgb))
+def write_tiff(rgb, filename:str, compress_level:int):
+    Image.fromarray(rgb).save(filename+".tiff", format="tiff")
+def write_raw(rgb, filename:str, compress_level:int):
+    #the bare RGB-bytes, row by row from the top. The shape has to be known by the reader. 
+    rgb.tofile(filename+".raw")
+
+#dict. for the image formats 
+imageFormats = {
+    "png": write_png,
+    "qoi": write_qoi,
+    "tiff": write_tiff,
+    "raw": write_raw }
+
+def save_image(set, filename:str, color:str, format:str="png", compress_level:int=6):
+    """Saves the given set as an image with the given filename, using the specified colormap to map 
+    the array (with values between 0 and 1) to a nice color gradient. 
+    The format is one of imageFormats; the uncompressed tiff, raw and qoi formats, or png with a 
+    low compress_level, are much faster to write, for intermediate frames. """
+    imageFormats[format](colorize(set, color), filename, compress_level)
@@ -0,0 +1,323 @@
+# Asynchronous HTTP server that serves the fractals as XYZ (slippy map) tiles,
+# so that the explorer can be used from a browser with e.g. Leaflet or OpenLayers.
+#
+# Tiles are requested as /{formula}/{z}/{x}/{y}.png, where the formula is the url-encoded
+# polynomial in z and c (same syntax as in the GUI), optionally with ?color=...&interp=...&mode=...
+# The tiles are rendered in a process pool, concurrent requests for the same tile share
+# one render, and encoded PNGs are kept in an LRU cache. Renders wait in a bounded queue
+# for a free worker, and only when that queue is full new renders are refused with 503.
+
+import argparse
+import ast
+import asyncio
+import multiprocessing
+import os
+import sys
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from urllib.parse import unquote, urlsplit, parse_qs
+import fractalGenerator
+
+TILE_SIZE = 256
+
+#the square region of the plane covered by the tile at zoom level 0.
+WORLD_X0 = -2.5
+WORLD_Y0 = 2.0
+WORLD_SIZE = 4.0
+
+#iteration limit at zoom level 0, and how much it grows for every zoom level.
+ITER_BASE = 40
+ITER_PER_ZOOM = 20
+
+#the workers are started with 'spawn', not forked from the running server; forked workers would 
+#inherit the listening socket and the open client connections, which then never see EOF when closed.
+POOL_CONTEXT = multiprocessing.get_context("spawn")
+
+#python < 3.8 parses numeric literals as ast.Num instead of ast.Constant.
+NUMBER_NODES = (ast.Constant,) if sys.version_info >= (3, 8) else (ast.Num,)
+
+MAX_ZOOM = 40
+MAX_FORMULA_LENGTH = 64
+MAX_DEGREE = 12
+
+DEFAULT_COLOR = "Inferno"
+DEFAULT_INTERP = "Autolog"
+DEFAULT_MODE = "Smooth"
+
+INDEX_HTML = """<!DOCTYPE html>
+<html>
+<head>
+<title>Fractal Generator</title>
+<link rel="stylesheet" href="https://unpkg.com/leaflet@1.9.4/dist/leaflet.css"/>
+<script src="https://unpkg.com/leaflet@1.9.4/dist/leaflet.js"></script>
+<style>html, body, #map { height: 100%; margin: 0; }</style>
+</head>
+<body>
+<div id="map"></div>
+<script>
+var formula = encodeURIComponent(new URLSearchParams(location.search).get("f") || "z**2 + c");
+var map = L.map("map", {crs: L.CRS.Simple, center: [-128, 128], zoom: 1});
+L.tileLayer("/" + formula + "/{z}/{x}/{y}.png" + location.search,
+            {tileSize: 256, maxZoom: 40, noWrap: true}).addTo(map);
+</script>
+</body>
+</html>
+"""
+
+
+class TileError(Exception):
+    """Raised for requests that can't be turned into a tile, carries the http status."""
+    def __init__(self, status:int, message:str):
+        super().__init__(message)
+        self.status = status
+
+
+def _number(node):
+    """The value of the node if it's an int or float literal, otherwise None."""
+    if not isinstance(node, NUMBER_NODES):
+        return None
+    value = node.value if isinstance(node, ast.Constant) else node.n
+    return value if type(value) in (int, float) else None
+
+def _degree(node):
+    """Returns an upper bound for the degree of the polynomial represented by the ast-node,
+    and raises TileError if the node is anything but a polynomial in z and c."""
+    if isinstance(node, ast.Expression):
+        return _degree(node.body)
+    if isinstance(node, ast.Name) and node.id in ("z", "c", "I"):
+        return 0 if node.id == "I" else 1
+    if _number(node) is not None:
+        return 0
+    if isinstance(node, ast.UnaryOp) and isinstance(node.op, (ast.UAdd, ast.USub)):
+        return _degree(node.operand)
+    if isinstance(node, ast.BinOp):
+        left = _degree(node.left)
+        if isinstance(node.op, ast.Pow):
+            #only allow explicit integer exponents, so that z**9**9 can't blow up.
+            exp = _number(node.right)
+            if not (type(exp) is int and 0 <= exp <= MAX_DEGREE):
+                raise TileError(400, "exponents must be small non-negative integers")
+            return left*exp
+        right = _degree(node.right)
+        if isinstance(node.op, (ast.Add, ast.Sub)):
+            return max(left, right)
+        if isinstance(node.op, ast.Mult):
+            return left + right
+        if isinstance(node.op, ast.Div) and right == 0:
+            return left
+    raise TileError(400, "the formula has to be a polynomial in z and c")
+
+def validate_formula(formula:str):
+    """Checks that the formula is a reasonably small polynomial in z and c.
+    This is important since the formula ends up being evaluated as python code."""
+    if len(formula) > MAX_FORMULA_LENGTH:
+        raise TileError(400, "formula too long")
+    try:
+        tree = ast.parse(formula, mode="eval")
+    except SyntaxError:
+        raise TileError(400, "invalid formula syntax")
+    if _degree(tree) > MAX_DEGREE:
+        raise TileError(400, "degree of the formula too large")
+    return formula
+
+def tile_bounds(z:int, x:int, y:int):
+    """Returns the region (xmin,xmax,ymin,ymax) of the plane covered by the given tile."""
+    size = WORLD_SIZE/2**z
+    xmin = WORLD_X0 + x*size
+    ymax = WORLD_Y0 - y*size
+    return xmin, xmin + size, ymax - size, ymax
+
+def render_tile(formula:str, z:int, x:int, y:int, color:str, interp:str, mode:str):
+    """Renders the given tile and returns it as encoded png-bytes. Runs in the worker processes."""
+    xmin, xmax, ymin, ymax = tile_bounds(z, x, y)
+    #the lattice is at the centres of the pixels, so that neighbouring tiles don't share their edge.
+    half_pixel = (xmax-xmin)/(2*TILE_SIZE)
+    maxiter = ITER_BASE + ITER_PER_ZOOM*z
+    set, time = fractalGenerator.get_fractal_set(formula, xmin + half_pixel, xmax - half_pixel,
+                                                 ymin + half_pixel, ymax - half_pixel,
+                                                 TILE_SIZE, TILE_SIZE, maxiter,
+                                                 channels=fractalGenerator.colorModeChannels[mode])
+    set = fractalGenerator.rescale(set, maxiter, interp, mode)
+    #the tiles are small, and the pool already keeps the cores busy, so no threads within a tile.
+    rgb = fractalGenerator.colorize(set, color, workers=1)
+    return fractalGenerator.encode_png(rgb, workers=1)
+
+
+class TileCache:
+    """LRU-cache of encoded tiles, evicting the least recently used tiles when
+    the total size goes above max_bytes."""
+    def __init__(self, max_bytes:int):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.tiles = OrderedDict()
+
+    def get(self, key):
+        data = self.tiles.get(key)
+        if data is not None:
+            self.tiles.move_to_end(key)
+        return data
+
+    def put(self, key, data:bytes):
+        if key in self.tiles:
+            self.size -= len(self.tiles.pop(key))
+        self.tiles[key] = data
+        self.size += len(data)
+        while self.size > self.max_bytes and self.tiles:
+            _, old = self.tiles.popitem(last=False)
+            self.size -= len(old)
+
+
+class TileServer:
+    """Serves the tiles over HTTP/1.1, rendering them in a process pool."""
+    def __init__(self, workers:int=None, cache_bytes:int=256*2**20, max_pending:int=None):
+        self.workers = workers or os.cpu_count() or 1
+        self.pool = ProcessPoolExecutor(self.workers, mp_context=POOL_CONTEXT)
+        self.cache = TileCache(cache_bytes)
+        #tiles currently being rendered or waiting for a worker, so that concurrent requests 
+        #for the same tile share the result.
+        self.inflight = {}
+        #only as many renders as there are workers are handed to the pool, the rest wait here.
+        #(created in serve, inside the event loop)
+        self.slots = None
+        #renders beyond this are refused, instead of letting the queue grow without bounds.
+        #a full screen map asks for a few dozen tiles at once, so this has to be fairly large.
+        self.max_pending = max_pending or 256*self.workers
+
+    async def get_tile(self, key):
+        """Returns the png-bytes of the tile, from the cache, a render in progress or a new render."""
+        data = self.cache.get(key)
+        if data is not None:
+            return data
+        future = self.inflight.get(key)
+        if future is None:
+            if len(self.inflight) >= self.max_pending:
+                raise TileError(503, "server busy")
+            loop = asyncio.get_running_loop()
+            future = asyncio.ensure_future(self._render(key, loop))
+            self.inflight[key] = future
+        #shielded, so that a client disconnecting doesn't cancel the render for the others waiting on it.
+        return await asyncio.shield(future)
+
+    async def _render(self, key, loop):
+        try:
+            async with self.slots:
+                pool = self.pool 
+                try:
+                    data = await loop.run_in_executor(pool, render_tile, *key)
+                except BrokenProcessPool:
+                    #a worker died, replace the pool so that the following tiles can be rendered.
+                    if self.pool is pool:
+                        self.pool = ProcessPoolExecutor(self.workers, mp_context=POOL_CONTEXT)
+                        pool.shutdown(wait=False)
+                    raise TileError(503, "render worker crashed")
+                except Exception:
+                    raise TileError(400, "could not render the formula")
+        finally:
+            del self.inflight[key]
+        self.cache.put(key, data)
+        return data
+
+    def parse_path(self, target:str):
+        """Turns the request target into the cache key (formula,z,x,y,color,interp,mode) of the tile."""
+        url = urlsplit(target)
+        parts = url.path.rsplit("/", 3)
+        if len(parts) != 4 or not parts[3].endswith(".png"):
+            raise TileError(404, "not found")
+        formula = validate_formula(unquote(parts[0].lstrip("/")))
+        try:
+            z, x, y = int(parts[1]), int(parts[2]), int(parts[3][:-4])
+        except ValueError:
+            raise TileError(404, "not found")
+        if not (0 <= z <= MAX_ZOOM and 0 <= x < 2**z and 0 <= y < 2**z):
+            raise TileError(404, "tile out of range")
+
+        query = parse_qs(url.query)
+        color = query.get("color", [DEFAULT_COLOR])[0]
+        interp = query.get("interp", [DEFAULT_INTERP])[0]
+        mode = query.get("mode", [DEFAULT_MODE])[0]
+        if color not in fractalGenerator.colorschemes or interp not in fractalGenerator.colorInterpolations \
+            or mode not in fractalGenerator.colorModes:
+            raise TileError(400, "unknown color scheme, interpolation or coloring mode")
+        return (formula, z, x, y, color, interp, mode)
+
+    async def handle(self, reader, writer):
+        """Handles the requests of one connection, keeping it alive until the client closes it."""
+        try:
+            while True:
+                request = await reader.readline()
+                if not request:
+                    break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip().lower()
+                try:
+                    method, target, version = request.decode("latin-1").split()
+                except ValueError:
+                    break
+                keep_alive = headers.get("connection") != "close" and version == "HTTP/1.1"
+
+                status, ctype, body = await self.respond(method, target)
+                writer.write(self.header(status, ctype, len(body), keep_alive) + (body if method == "GET" else b""))
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def respond(self, method:str, target:str):
+        """Returns (status, content-type, body) for the request."""
+        if method not in ("GET", "HEAD"):
+            return 405, "text/plain", b"method not allowed"
+        if urlsplit(target).path in ("/", "/index.html"):
+            return 200, "text/html; charset=utf-8", INDEX_HTML.encode()
+        try:
+            key = self.parse_path(target)
+            return 200, "image/png", await self.get_tile(key)
+        except TileError as e:
+            return e.status, "text/plain", str(e).encode()
+
+    @staticmethod
+    def header(status:int, ctype:str, length:int, keep_alive:bool):
+        reasons = {200: "OK", 400: "Bad Request", 404: "Not Found",
+                   405: "Method Not Allowed", 503: "Service Unavailable"}
+        lines = [f"HTTP/1.1 {status} {reasons[status]}",
+                 f"Content-Type: {ctype}",
+                 f"Content-Length: {length}",
+                 "Connection: " + ("keep-alive" if keep_alive else "close")]
+        if status == 200 and ctype == "image/png":
+            lines.append("Cache-Control: public, max-age=86400")
+        if status == 503:
+            lines.append("Retry-After: 1")
+        return ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1")
+
+    async def serve(self, host:str, port:int):
+        self.slots = asyncio.Semaphore(self.workers)
+        server = await asyncio.start_server(self.handle, host, port)
+        print(f"Serving tiles on http://{host}:{port}/")
+        async with server:
+            await server.serve_forever()
+
+
+######### Runs the thing: ############
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Serves the fractals as XYZ map tiles.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=None, help="number of render processes")
+    parser.add_argument("--cache-mb", type=int, default=256, help="size of the tile cache in MB")
+    parser.add_argument("--max-pending", type=int, default=None,
+                        help="max number of tiles rendering or queued before answering 503")
+    args = parser.parse_args()
+
+    tileserver = TileServer(args.workers, args.cache_mb*2**20, args.max_pending)
+    try:
+        asyncio.run(tileserver.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
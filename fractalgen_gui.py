@@ -5,9 +5,9 @@ import sys, os
 import datetime
 import numpy as np 
 from numba import jit
-from PyQt5.QtCore import Qt, QThread, pyqtSignal, pyqtSlot, QModelIndex
+from PyQt5.QtCore import Qt, QThread, QTimer, QRectF, pyqtSignal, pyqtSlot, QModelIndex
 import configparser
-from PyQt5.QtGui import (QPixmap, QIntValidator, 
+from PyQt5.QtGui import (QPixmap, QImage, QIntValidator, 
                         QIcon, QDoubleValidator,
                         QPainter, QColor, QPen, QBrush)
 from PyQt5.QtWidgets import (QWidget, QApplication,
@@ -21,6 +21,17 @@ from PyQt5.QtWidgets import (QWidget, QApplication,
                              QSizePolicy)
 import fractalGenerator
 
+#the previews shown while zooming/panning are rendered at 1/PREVIEW_SCALE of the resolution.
+PREVIEW_SCALE = 4
+#how long (ms) to wait after the last wheel-event before rendering the preview.
+PREVIEW_DELAY = 120
+
+
+def formatCoordinate(x):
+    """Formats a coordinate for the input boxes, with full precision, so that the view 
+    doesn't get rounded when read back from the boxes (which would break deep zooms)."""
+    return repr(float(x))
+
 
 class FractalGenWindow(QWidget):
     """The main window of the program."""
@@ -30,6 +41,8 @@ class FractalGenWindow(QWidget):
         super().__init__()
         self.initUI()
         self.readConfigFile()
+        #current.png was rendered with the view saved in the config file.
+        self.imgView.pixmapView = self.imgView.currentView()
 
     def initUI(self):
         """sets up the user interface, connects all the signals and shows the window. """
@@ -44,6 +57,17 @@ class FractalGenWindow(QWidget):
         self.setImage("current.png")
         self.fractalSet = None 
 
+        #background renders. Each render gets a generation number, so that results 
+        #arriving out of order never replace a newer image.
+        self.get_thread = None 
+        self.preview_thread = None 
+        self.renderPending = False 
+        self.previewPending = False 
+        self.renderGeneration = 0 
+
+        #the last validated function and the result, since validating compiles it.
+        self.validatedFunction = (None, False)
+
         initial_view = self.makeConfig() 
         self.history = [ initial_view ]
         self.history_index = 0 
@@ -131,12 +155,24 @@ class FractalGenWindow(QWidget):
 
         
         interpLabel = QLabel('Color interpolation')
+
+        self.colorModeCb = QComboBox()
+        self.colorModeCb.addItems([ "Smooth", "Angle",
+                                "Binary decomposition",
+                                "Distance estimate", "Orbit trap" ])
+
+        colorModeLabel = QLabel('Coloring mode')
         
         
         self.runButton = QPushButton('Generate image')
         self.saveButton = QPushButton('save image')
         self.backButton = QPushButton('Back')
         self.resetButton = QPushButton("Reset View")
+
+        #restarted on every wheel-event, the preview is rendered once the user stops scrolling.
+        self.previewTimer = QTimer(self)
+        self.previewTimer.setSingleShot(True)
+        self.previewTimer.setInterval(PREVIEW_DELAY)
         # self.fileModel = QFileSystemModel()
         # self.tree = QTreeView()
         # self.tree.setModel(self.fileModel)
@@ -179,12 +215,15 @@ class FractalGenWindow(QWidget):
         grid.addWidget(interpLabel, 8,0,1,2)
         grid.addWidget(self.interpCb,8,2,1,2)
 
-        grid.addWidget(self.runButton,9,0,1,4)
-        grid.addWidget(self.backButton, 10,0)
-        grid.addWidget(self.saveButton,10,1,1,2)
-        grid.addWidget(self.resetButton, 10,3)
+        grid.addWidget(colorModeLabel, 9,0,1,2)
+        grid.addWidget(self.colorModeCb,9,2,1,2)
+
+        grid.addWidget(self.runButton,10,0,1,4)
+        grid.addWidget(self.backButton, 11,0)
+        grid.addWidget(self.saveButton,11,1,1,2)
+        grid.addWidget(self.resetButton, 11,3)
         # grid.addWidget(self.dirLabel,8,0,8,3)
-        grid.addWidget(self.outputText,11,0,8,4)
+        grid.addWidget(self.outputText,12,0,8,4)
         grid.addWidget(self.posLabel,20,0,1,4)
         # grid.addWidget(self.stopButton,5,0)
         # grid.addWidget(self.runButton,5,1)
@@ -226,6 +265,7 @@ class FractalGenWindow(QWidget):
 
         self.backButton.clicked.connect(self.goBack)
         self.resetButton.clicked.connect(self.resetView)
+        self.previewTimer.timeout.connect(self.runPreviewThreaded)
 
         self.setMouseTracking(True) 
         self.imgView.setMouseTracking(True)
@@ -256,16 +296,26 @@ class FractalGenWindow(QWidget):
 
         colorscheme = "Inferno"
         colorinterp = "Autolog" 
+        colormode = "Smooth" 
 
         self.viewConfig = ViewConfig(x0,x1,y0,y1,width,height,function,
-                        iter_limit, colorscheme, colorinterp)
+                        iter_limit, colorscheme, colorinterp, colormode)
         self.loadConfig(self.viewConfig)
      
     def runGenerationThreaded(self):
         """What happens when the user clicks the 'generate' button.
-        Creates a thread to run the fractal generation, and runs it. """ 
+        Creates a thread to run the fractal generation, and runs it. 
+        If a generation is already running, the new one is started when it finishes. """ 
         view = self.makeConfig() 
+        #the selection rectangle is now the view, and the old image is reprojected into it.
+        self.imgView.rect_x0p=-1
+        self.imgView.rect_y0p=-1
+        self.imgView.update()
         if self.validateFunction():
+            if self.get_thread is not None and self.get_thread.isRunning():
+                self.renderPending = True 
+                return 
+            self.renderPending = False 
             self.saveConfig() 
             self.history.append(view)
             self.history_index = len(self.history)-1 
@@ -274,13 +324,15 @@ class FractalGenWindow(QWidget):
 
 
             filename = "current"
+            self.renderGeneration += 1 
 
             if ViewChanged:
                 self.get_thread = FractalGenThread(view,filename,self)
             else:
                 self.get_thread = FractalGenThread(view, filename,self,set=self.fractalSet)
+            self.get_thread.generation = self.renderGeneration 
             self.get_thread.changeText.connect(self.update_output_text)
-            self.get_thread.finished.connect(self.image_finished)
+            self.get_thread.rendered.connect(self.image_finished)
             # self.get_thread.finished.connect(self.setImage)
 
             # self.update_output_text("Starting... ")
@@ -298,6 +350,21 @@ class FractalGenWindow(QWidget):
             msgBox.exec_()
             pass 
 
+    def runPreviewThreaded(self):
+        """Renders a low resolution image of the current view in the background, shown while
+        the user is zooming or panning. When it's done, the full resolution image is generated."""
+        if not self.validateFunction():
+            return 
+        if self.preview_thread is not None and self.preview_thread.isRunning():
+            self.previewPending = True 
+            return 
+        self.previewPending = False 
+        view = self.makeConfig() 
+        self.renderGeneration += 1 
+        self.preview_thread = PreviewThread(view, self.renderGeneration)
+        self.preview_thread.rendered.connect(self.preview_finished)
+        self.preview_thread.start() 
+
     def showSaveDialog(self):
         """Shows the dialog to choose where to save the current image, and saves it as a png-file.""" 
         dlg = QFileDialog()
@@ -321,14 +388,37 @@ class FractalGenWindow(QWidget):
         self.outputText.setText(self.outputText.toPlainText() + message)
          
 
-    @pyqtSlot()
-    def image_finished(self):
-        #reset rectangle coordinates, so that it's no longer drawn. 
-        self.imgView.rect_x0p=-1
-        self.imgView.rect_y0p=-1
+    @pyqtSlot(object, int)
+    def image_finished(self, view, generation):
+        #if a newer generation has started since, it may already be writing the file, 
+        #and it will show its own image.
+        if generation != self.get_thread.generation:
+            return 
         #reload the image:
-        self.imgView.pixmap=QPixmap(self.imgView.filepath)
-        self.imgView.update()
+        self.imgView.setRendered(QPixmap(self.imgView.filepath), view, generation)
+        if self.renderPending:
+            self.get_thread.wait()
+            self.runGenerationThreaded()
+
+    @pyqtSlot(QImage, object, int)
+    def preview_finished(self, image, view, generation):
+        """Shows the preview, and either renders a newer preview or the full resolution image."""
+        self.imgView.setRendered(QPixmap.fromImage(image), view, generation)
+        #a newer preview has been started since, it continues the chain when it finishes.
+        if generation != self.preview_thread.generation:
+            return 
+        self.preview_thread.wait()
+        if self.previewPending:
+            self.runPreviewThreaded()
+        else:
+            self.runGenerationThreaded()
+
+    def setViewInputs(self, x0, x1, y0, y1):
+        """Writes the given view into the input boxes."""
+        self.x0Input.setText(formatCoordinate(x0) )
+        self.x1Input.setText(formatCoordinate(x1) )
+        self.y0Input.setText(formatCoordinate(y0) )
+        self.y1Input.setText(formatCoordinate(y1) )
 
     def checkViewChange(self):
         """Checks if the user changed the view settings so that we have to 
@@ -350,10 +440,10 @@ class FractalGenWindow(QWidget):
 
     def loadConfig(self,cfg ):
         """Sets all the settings as specified from the config-class"""
-        self.x0Input.setText("{0:.7f}".format(float(cfg.x0)))
-        self.x1Input.setText("{0:.7f}".format(float(cfg.x1)))
-        self.y0Input.setText("{0:.7f}".format(float(cfg.y0)))
-        self.y1Input.setText("{0:.7f}".format(float(cfg.y1)))
+        self.x0Input.setText(formatCoordinate(float(cfg.x0)))
+        self.x1Input.setText(formatCoordinate(float(cfg.x1)))
+        self.y0Input.setText(formatCoordinate(float(cfg.y0)))
+        self.y1Input.setText(formatCoordinate(float(cfg.y1)))
         self.widthInput.setText(str(cfg.width))
         self.heightInput.setText(str(cfg.height))
         # self.heightInput.setText(str(cfg.height))
@@ -362,6 +452,8 @@ class FractalGenWindow(QWidget):
 
         self.colorschemeCb.setCurrentText(cfg.colorscheme)
         self.interpCb.setCurrentText(cfg.colorinterp)
+        #config files from older versions don't have the coloring mode.
+        self.colorModeCb.setCurrentText(getattr(cfg, 'colormode', "Smooth"))
 
         cfg.x0 = float(cfg.x0)
         cfg.x1 = float(cfg.x1)
@@ -376,6 +468,7 @@ class FractalGenWindow(QWidget):
         self.imgView.x1 = cfg.x1
         self.imgView.y0 = cfg.y0
         self.imgView.y1 = cfg.y1
+        self.imgView.update()
 
     def makeConfig(self):
         """Reads current settings and creates a corresponding config-class. 
@@ -392,6 +485,7 @@ class FractalGenWindow(QWidget):
 
         colorscheme = self.colorschemeCb.currentText() 
         colorinterp = self.interpCb.currentText() 
+        colormode = self.colorModeCb.currentText() 
 
         self.imgView.x0 = x0
         self.imgView.x1 = x1
@@ -399,7 +493,7 @@ class FractalGenWindow(QWidget):
         self.imgView.y1 = y1
 
         self.viewConfig = ViewConfig(x0,x1,y0,y1,width,height,function,
-                        iter_limit, colorscheme, colorinterp)
+                        iter_limit, colorscheme, colorinterp, colormode)
         return self.viewConfig
 
     def saveConfig(self):
@@ -415,14 +509,23 @@ class FractalGenWindow(QWidget):
             'iter_limit':view.iter_limit,
             'colorscheme':view.colorscheme,
             'colorinterp':view.colorinterp,
+            'colormode':view.colormode,
             'function':view.function       
         }
         with open('fractalGen.ini','w') as configfile:
             self.config.write(configfile)
 
     def validateFunction(self):
+        """Checks that the function compiles. The result is cached, since compiling 
+        takes long enough to be noticeable while zooming."""
+        function = self.functionInput.text() 
+        if function == self.validatedFunction[0]:
+            return self.validatedFunction[1]
+        self.validatedFunction = (function, self.compileFunction(function))
+        return self.validatedFunction[1]
+
+    def compileFunction(self, function:str):
         try:
-            function = self.functionInput.text() 
             lambdastr=f'lambda z,c:'+function.replace("I",'complex(0,1)')
             lambdafunc = eval(lambdastr)
             func = jit(nopython=True)(lambdafunc)
@@ -438,7 +541,7 @@ class FractalGenThread(QThread):
     """Defines the thread that generates the fractal"""
 
     changeText = pyqtSignal(str)
-    finished = pyqtSignal()
+    rendered = pyqtSignal(object, int)
 
     def __init__(self, view, filename:str, parent, set=None):
 
@@ -462,7 +565,7 @@ class FractalGenThread(QThread):
         self.wait()
 
     def run(self):
-        """Runs the fractal generation and at the end, displays the new image in the image-viewer (through the finished signal)"""
+        """Runs the fractal generation and at the end, displays the new image in the image-viewer (through the rendered signal)"""
         self.changeText.emit('Generating ... ')
         view = self.view 
         if not self.useStoredSet:            
@@ -470,7 +573,9 @@ class FractalGenThread(QThread):
             set, time = fractalGenerator.get_fractal_set(
                 view.function, view.x0, view.x1,
                 view.y1, view.y0, 
-                view.width, view.height, view.iter_limit
+                view.width, view.height, view.iter_limit,
+                #all channels are stored, so that switching the coloring mode only recolors.
+                channels=fractalGenerator.CHANNELS
             )
             self.parent.fractalSet = set 
         else:
@@ -478,24 +583,59 @@ class FractalGenThread(QThread):
             time = 0.001 
 
         
-        set = fractalGenerator.rescale(set,view.iter_limit, view.colorinterp)
-        fractalGenerator.save_image(set, self.filepath, view.colorscheme)
+        set = fractalGenerator.rescale(set,view.iter_limit, view.colorinterp, view.colormode)
+        #current.png is only read back by the viewer, so a fast compression level is enough.
+        fractalGenerator.save_image(set, self.filepath, view.colorscheme, compress_level=1)
 
-        self.finished.emit()
+        self.rendered.emit(view, self.generation)
         self.changeText.emit( "took {0:.4f}".format(time) + ' seconds \n')
 
 
+class PreviewThread(QThread):
+    """Defines the thread that renders the low resolution previews while zooming and panning.
+    The image is kept in memory instead of being written to a file."""
+
+    rendered = pyqtSignal(QImage, object, int)
+
+    def __init__(self, view, generation:int):
+        QThread.__init__(self)
+        self.view = view 
+        self.generation = generation 
+
+    def __del__(self):
+        self.wait()
+
+    def run(self):
+        view = self.view 
+        width = max(view.width//PREVIEW_SCALE, 2)
+        height = max(view.height//PREVIEW_SCALE, 2)
+        set, time = fractalGenerator.get_fractal_set(
+            view.function, view.x0, view.x1,
+            view.y1, view.y0, 
+            width, height, view.iter_limit,
+            channels=fractalGenerator.colorModeChannels[view.colormode]
+        )
+        set = fractalGenerator.rescale(set,view.iter_limit, view.colorinterp, view.colormode)
+        img = fractalGenerator.colorize(set, view.colorscheme)
+        image = QImage(img.data, img.shape[1], img.shape[0], 3*img.shape[1], QImage.Format_RGB888).copy()
+        self.rendered.emit(image, view, self.generation)
+
+
 class FractalViewer(QLabel):
     """The widget that displays the fractal.
     Implements methods for selecting a new viewport, 
     and rendering the selection rectangle showing 
-    which part we are zooming in about"""
+    which part we are zooming in about. 
+    The mouse wheel zooms about the cursor and dragging with the right button pans; 
+    while doing so the last rendered image is reprojected into the new view, 
+    until the background render replaces it."""
     def __init__(self, parent_window):
         super().__init__()
 
         self.mousePressed = False 
         self.parent = parent_window
         self.filepath="" 
+        self.pixmap = QPixmap()
         # self.pixmap = QPixmap(self.parent.filepath)
 
         self.x0 = -2
@@ -503,6 +643,12 @@ class FractalViewer(QLabel):
         self.x1 = 1
         self.y1 = -1.25
 
+        #the view (x0,x1,y0,y1) that the pixmap was rendered with, and the generation of the render.
+        self.pixmapView = self.currentView()
+        self.generation = 0 
+
+        #the pixel position and view when the panning started.
+        self.panStart = None 
         
         self.rect_x0p = -100
         self.rect_y0p = -100
@@ -511,49 +657,115 @@ class FractalViewer(QLabel):
         
         self.setMouseTracking(True)
 
-    def mouseMoveEvent(self, event):
-        w = self.pixmap.scaledToHeight(800).width()
+    def currentView(self):
+        return (self.x0, self.x1, self.y0, self.y1)
+
+    def setRendered(self, pixmap, view, generation:int):
+        """Shows a newly rendered pixmap of the given view, unless a newer one is already shown."""
+        if generation < self.generation:
+            return 
+        self.generation = generation 
+        self.pixmap = pixmap 
+        self.pixmapView = (float(view.x0), float(view.x1), float(view.y0), float(view.y1))
+        self.update()
+
+    def displaySize(self):
+        """The size in pixels of the displayed image, which is scaled to the height of the widget."""
         h = self.geometry().height() 
+        if self.pixmap.isNull():
+            return self.geometry().width(), h
+        return self.pixmap.width()*h/self.pixmap.height(), h
+
+    def isDegenerate(self, view):
+        x0, x1, y0, y1 = view 
+        return x0 == x1 or y0 == y1 
+
+    def toPlane(self, x, y):
+        """Maps the pixel position in the widget to the point in the plane."""
+        w,h = self.displaySize() 
+        if w == 0 or h == 0:
+            return self.x0, self.y0
+        x = self.x0 + x*(self.x1-self.x0)/w
+        y = self.y0 - y*(self.y0-self.y1)/h
+        return x,y
+
+    def viewChanged(self):
+        """Called while zooming/panning: shows the reprojected image and schedules the preview render."""
+        self.parent.setViewInputs(self.x0, self.x1, self.y0, self.y1)
+        self.update() 
+        self.parent.previewTimer.start() 
+
+    def wheelEvent(self, event):
+        """Zooms in or out about the point under the cursor."""
+        factor = 0.8**(event.angleDelta().y()/120)
+        px, py = self.toPlane(event.x(), event.y())
+        view = (px + (self.x0-px)*factor, px + (self.x1-px)*factor,
+                py + (self.y0-py)*factor, py + (self.y1-py)*factor)
+        #at the limit of the floating point precision, stop zooming in. 
+        if self.isDegenerate(view):
+            return 
+        self.x0, self.x1, self.y0, self.y1 = view 
+        self.viewChanged() 
+
+    def mouseMoveEvent(self, event):
         x = event.x()
         y = event.y()
-        if self.mousePressed :
+        if self.panStart is not None:
+            w,h = self.displaySize() 
+            startx, starty, (x0,x1,y0,y1) = self.panStart
+            dx = (x-startx)*(x1-x0)/w
+            dy = (y-starty)*(y0-y1)/h
+            self.x0, self.x1 = x0-dx, x1-dx
+            self.y0, self.y1 = y0+dy, y1+dy
+            self.parent.setViewInputs(self.x0, self.x1, self.y0, self.y1)
+            self.update() 
+        elif self.mousePressed :
             self.rect_dx = x - self.rect_x0p
             self.rect_dy = y - self.rect_y0p
             self.update() 
 
-        x = self.x0 + x*(self.x1-self.x0)/w
-        y = self.y0 - y*(self.y0-self.y1)/h
+        x,y = self.toPlane(x,y)
 
         self.parent.posLabel.setText("Mouse position : ( {0:.8f}".format(x) +", {0:.8f}".format(y) + ")" ) 
 
     def mousePressEvent(self,event):
-        self.mousePressed = True 
-        w = self.pixmap.scaledToHeight(800).width()
-        h = self.geometry().height() 
         x = event.x()
         y = event.y()
+        if event.button() == Qt.RightButton:
+            self.panStart = (x, y, self.currentView())
+            return 
+
+        self.mousePressed = True 
         self.rect_x0p = x
         self.rect_y0p = y 
+        self.rect_dx = 0
+        self.rect_dy = 0
 
-        x = self.x0 + x*(self.x1-self.x0)/w
-        y = self.y0 - y*(self.y0-self.y1)/h
+        x,y = self.toPlane(x,y)
 
         self.rect_x0 = x
         self.rect_y0 = y 
 
-        self.parent.x0Input.setText("{0:.7f}".format(x) )
-        self.parent.y0Input.setText("{0:.7f}".format(y) )
+        self.parent.x0Input.setText(formatCoordinate(x) )
+        self.parent.y0Input.setText(formatCoordinate(y) )
 
 
     def mouseReleaseEvent(self,event):
-        self.mousePressed=False 
-        w = self.pixmap.scaledToHeight(800).width()
-        h = self.geometry().height() 
-        x = event.x()
-        y = event.y()
+        if event.button() == Qt.RightButton:
+            if self.panStart is not None:
+                self.panStart = None 
+                self.viewChanged() 
+            return 
 
-        x = self.x0 + x*(self.x1-self.x0)/w
-        y = self.y0 - y*(self.y0-self.y1)/h
+        self.mousePressed=False 
+        if event.x() == self.rect_x0p or event.y() == self.rect_y0p:
+            #just a click, not a rectangle; keep the current view. 
+            self.rect_x0p = -1
+            self.rect_y0p = -1
+            self.parent.setViewInputs(self.x0, self.x1, self.y0, self.y1)
+            self.update() 
+            return 
+        x,y = self.toPlane(event.x(), event.y())
 
         ##make sure that the upper-left point goes to (x0,y0)
         x0t = min(x,self.rect_x0)
@@ -571,21 +783,36 @@ class FractalViewer(QLabel):
 
 
         #update the numbers in the boxes 
-        self.parent.x0Input.setText("{0:.7f}".format(self.rect_x0) )
-        self.parent.y0Input.setText("{0:.7f}".format(self.rect_y0) )
-        self.parent.x1Input.setText("{0:.7f}".format(self.rect_x1) )
-        self.parent.y1Input.setText("{0:.7f}".format(self.rect_y1) )
+        self.parent.x0Input.setText(formatCoordinate(self.rect_x0) )
+        self.parent.y0Input.setText(formatCoordinate(self.rect_y0) )
+        self.parent.x1Input.setText(formatCoordinate(self.rect_x1) )
+        self.parent.y1Input.setText(formatCoordinate(self.rect_y1) )
         self.update() 
 
     def paintEvent(self, e):
         qp = QPainter()
         qp.begin(self)
-        if self.filepath != "" : 
-            qp.drawPixmap(0,0,self.pixmap.scaledToHeight(800))
+        if not self.pixmap.isNull():
+            self.drawReprojected(qp)
         
         self.drawRectangle(qp)
         qp.end()
 
+    def drawReprojected(self, qp):
+        """Draws the pixmap where its view lies in the current view, scaled and shifted. 
+        When the views agree this is just the pixmap scaled to the height of the widget."""
+        if self.isDegenerate(self.currentView()) or self.isDegenerate(self.pixmapView):
+            return 
+        w,h = self.displaySize() 
+        px0, px1, py0, py1 = self.pixmapView 
+        left = (px0-self.x0)*w/(self.x1-self.x0)
+        right = (px1-self.x0)*w/(self.x1-self.x0)
+        top = (self.y0-py0)*h/(self.y0-self.y1)
+        bottom = (self.y0-py1)*h/(self.y0-self.y1)
+        if self.pixmapView != self.currentView():
+            qp.fillRect(0, 0, int(w), int(h), QColor(0, 0, 0))
+        qp.drawPixmap(QRectF(left, top, right-left, bottom-top), self.pixmap, QRectF(self.pixmap.rect()))
+
         
     def drawRectangle(self, qp):
         """draws the 'zooming' rectangle onto the fractal"""
@@ -601,7 +828,7 @@ class FractalViewer(QLabel):
     
 class ViewConfig:
     """Helperclass, stores all the info about the current view. """ 
-    def __init__(self, x0,x1,y0,y1,width,height,function,iter_limit, colorscheme, colorinterp):
+    def __init__(self, x0,x1,y0,y1,width,height,function,iter_limit, colorscheme, colorinterp, colormode="Smooth"):
         self.x0=x0
         self.x1=x1
         self.y0=y0
@@ -612,6 +839,7 @@ class ViewConfig:
         self.iter_limit = iter_limit
         self.colorscheme = colorscheme
         self.colorinterp = colorinterp 
+        self.colormode = colormode 
         return 
     
 
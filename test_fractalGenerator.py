@@ -0,0 +1,133 @@
+# Tests for the image encoders in fractalGenerator, checked by decoding the images with Pillow.
+
+import io
+import zlib
+import numpy as np
+import pytest
+from PIL import Image
+import fractalGenerator
+
+
+def decode(data:bytes):
+    return np.asarray(Image.open(io.BytesIO(data)).convert("RGB"))
+
+def random_image(seed:int, height:int, width:int):
+    """Random image with black pixels, runs and repeated colors, to hit all the QOI operations."""
+    rng = np.random.RandomState(seed)
+    palette = np.array([[0,0,0], [10,20,30], [90,90,90], [255,255,255], [11,21,29]], dtype=np.uint8)
+    rgb = palette[rng.randint(0, len(palette), (height, width))]
+    noise = rng.rand(height, width) < 0.3
+    rgb[noise] = rng.randint(0, 256, (noise.sum(), 3), dtype=np.uint8)
+    rgb[:, :width//4] = rgb[:, :1]
+    return rgb
+
+
+def test_qoi_black_after_index_collision():
+    rgb = np.array([[[10,20,30],[0,0,0],[10,20,30],[0,0,0],[90,90,90],[10,20,30],[90,90,90]]], dtype=np.uint8)
+    assert np.array_equal(decode(fractalGenerator.encode_qoi(rgb)), rgb)
+
+@pytest.mark.parametrize("seed", range(20))
+def test_qoi_roundtrip(seed):
+    rgb = random_image(seed, 23, 41)
+    assert np.array_equal(decode(fractalGenerator.encode_qoi(rgb)), rgb)
+
+@pytest.mark.parametrize("compress_level", [0, 1, 6, 9])
+@pytest.mark.parametrize("workers", [1, 4])
+def test_png_roundtrip(compress_level, workers):
+    #more rows than CHUNK_ROWS, so that the image is split into several deflate chunks.
+    rgb = random_image(compress_level, 2*fractalGenerator.CHUNK_ROWS + 17, 37)
+    data = fractalGenerator.encode_png(rgb, compress_level, workers)
+    assert np.array_equal(decode(data), rgb)
+
+def test_adler32_combine():
+    rng = np.random.RandomState(0)
+    a = rng.randint(0, 256, 100000, dtype=np.uint8).tobytes()
+    b = rng.randint(0, 256, 70001, dtype=np.uint8).tobytes()
+    combined = fractalGenerator._adler32_combine(zlib.adler32(a), zlib.adler32(b), len(b))
+    assert combined == zlib.adler32(a + b)
+
+def test_colorize_orientation():
+    #set[i,j] is the point (x_i, y_j): x to the right, y upwards in the image.
+    set = np.zeros((3, 2))
+    set[2, 1] = 1.0
+    rgb = fractalGenerator.colorize(set, "Greys inverted")
+    assert rgb.shape == (2, 3, 3)
+    assert rgb[0, 2].tolist() == [255, 255, 255]
+    assert rgb[1, 0].tolist() == [0, 0, 0]
+
+
+## Mirroring about the real axis 
+
+def unmirrored(monkeypatch, *args, **kwargs):
+    #the same generation, without detecting the symmetry.
+    with monkeypatch.context() as m:
+        m.setattr(fractalGenerator, "is_real_symmetric", lambda coefmatrix: False)
+        return fractalGenerator.get_fractal_set(*args, **kwargs)[0]
+
+#views on lattices that are already aligned with the axis (no snapping needed), centered and off-centre.
+MIRROR_VIEWS = [(-2.0, 1.0, -1.25, 1.25, 60, 50), (-2.0, 1.0, -1.25, 1.25, 60, 51), (-2.0, 1.0, -0.5, 1.25, 40, 351)]
+
+@pytest.mark.parametrize("function", ["z**2 + c", "z**3 - z + c"])
+@pytest.mark.parametrize("view", MIRROR_VIEWS)
+def test_mirrored_set(monkeypatch, function, view):
+    xmin, xmax, ymin, ymax, width, height = view 
+    assert (fractalGenerator.mirror_rows(ymin, ymax, height) >= 0).sum() > 0
+    set, _ = fractalGenerator.get_fractal_set(function, *view, 30)
+    expected = unmirrored(monkeypatch, function, *view, 30)
+    assert np.allclose(set, expected, rtol=1e-6, atol=1e-6, equal_nan=True)
+
+@pytest.mark.parametrize("view", MIRROR_VIEWS)
+def test_mirrored_channels(monkeypatch, view):
+    set, _ = fractalGenerator.get_fractal_set("z**2 + c", *view, 30, channels=fractalGenerator.CHANNELS)
+    expected = unmirrored(monkeypatch, "z**2 + c", *view, 30, channels=fractalGenerator.CHANNELS)
+    for name in fractalGenerator.CHANNELS:
+        #final_z of the mirrored rows is conjugated.
+        assert np.allclose(set[name], expected[name], rtol=1e-6, atol=1e-6, equal_nan=True), name
+
+def test_no_mirror_for_complex_coefficients(monkeypatch):
+    view = MIRROR_VIEWS[0]
+    set, _ = fractalGenerator.get_fractal_set("z**2 + I*c", *view, 30)
+    expected = unmirrored(monkeypatch, "z**2 + I*c", *view, 30)
+    assert np.array_equal(set, expected, equal_nan=True)
+
+def test_mirror_rows():
+    ymin, ymax, height = -0.5, 1.25, 351
+    r2 = np.linspace(ymin, ymax, height)
+    mirror = fractalGenerator.mirror_rows(ymin, ymax, height)
+    rows = np.nonzero(mirror >= 0)[0]
+    #every row below the axis whose mirror image is in the view is mirrored.
+    assert len(rows) == (r2 < 0).sum() == 100
+    assert np.allclose(r2[mirror[rows]], -r2[rows], atol=1e-12)
+
+@pytest.mark.parametrize("view", [(-0.5, 1.25, 251), (-0.7, 1.25, 800), (-1.25, 0.3, 99)])
+def test_snap_to_axis(view):
+    ymin, ymax, height = view 
+    step = (ymax-ymin)/(height-1)
+    assert (fractalGenerator.mirror_rows(ymin, ymax, height) >= 0).sum() == 0
+    snapped_min, snapped_max = fractalGenerator.snap_to_axis(ymin, ymax, height)
+    assert abs(snapped_min-ymin) <= step/4 + 1e-15 
+    assert np.isclose(snapped_max-snapped_min, ymax-ymin)
+    mirrored = (fractalGenerator.mirror_rows(snapped_min, snapped_max, height) >= 0).sum()
+    assert mirrored >= min((np.linspace(ymin, ymax, height) < 0).sum(), (np.linspace(ymin, ymax, height) > 0).sum()) - 1
+
+def test_snap_to_axis_away_from_axis():
+    assert fractalGenerator.snap_to_axis(0.1, 1.0, 100) == (0.1, 1.0)
+
+
+## Julia atlas 
+
+@pytest.mark.parametrize("function", ["z**2 + c", "z**3 + c"])
+def test_julia_atlas_tiles(function):
+    cxmin, cxmax, cymin, cymax, ncols, nrows = -1.0, 0.5, -0.75, 0.75, 4, 3
+    xmin, xmax, ymin, ymax, width, height = -1.5, 1.5, -1.5, 1.5, 30, 40
+    atlas, _ = fractalGenerator.get_julia_atlas(function, cxmin, cxmax, cymin, cymax, ncols, nrows,
+                                                xmin, xmax, ymin, ymax, width, height, 30)
+    assert atlas.shape == (ncols*width, nrows*height)
+    cx, cy = np.linspace(cxmin, cxmax, ncols), np.linspace(cymin, cymax, nrows)
+    for i in range(ncols):
+        for j in range(nrows):
+            tile, _ = fractalGenerator.get_fractal_set(function, xmin, xmax, ymin, ymax, width, height, 30,
+                                                       julia=cx[i]+1j*cy[j])
+            #the real c in the middle row gets mirrored, which only differs in rounding.
+            assert np.allclose(atlas[i*width:(i+1)*width, j*height:(j+1)*height], tile,
+                               rtol=1e-6, atol=1e-6, equal_nan=True), (i, j)
@@ -0,0 +1,71 @@
+# Tests for the request parsing and caching of the tile server, which decide what gets evaluated.
+
+import pytest
+import fractal_tileserver
+from fractal_tileserver import TileCache, TileError, TileServer, tile_bounds, validate_formula
+
+
+@pytest.mark.parametrize("formula", ["z**2 + c", "z**3 - z + c", "I*c + z**2", "0.5*z**2 + c/2",
+                                     "-(z+c)**2", "z**12 + c"])
+def test_accepted_formulas(formula):
+    assert validate_formula(formula) == formula
+
+@pytest.mark.parametrize("formula", ["__import__('os').system('ls')", "z**99", "c/z", "z**c",
+                                     "z**9**9", "z**-1", "abs(z) + c", "x + c", "z**2 +", "z" + "+c"*40,
+                                     "(z**6)**3", "z.real + c"])
+def test_rejected_formulas(formula):
+    with pytest.raises(TileError) as error:
+        validate_formula(formula)
+    assert error.value.status == 400
+
+
+def parse(target):
+    #parse_path doesn't use the pool, so no server has to be started for it.
+    return TileServer.parse_path(None, target)
+
+def test_parse_path():
+    key = parse("/z**2%20%2B%20c/3/5/2.png?color=Plasma&mode=Angle")
+    assert key == ("z**2 + c", 3, 5, 2, "Plasma", "Autolog", "Angle")
+
+@pytest.mark.parametrize("target", ["/z**2%2Bc/0/1/0.png", "/z**2%2Bc/2/0/4.png", "/z**2%2Bc/-1/0/0.png",
+                                    "/z**2%2Bc/41/0/0.png", "/z**2%2Bc/1/0/0.jpg", "/z**2%2Bc/1/a/0.png", "/0/0.png"])
+def test_parse_path_not_found(target):
+    with pytest.raises(TileError) as error:
+        parse(target)
+    assert error.value.status == 404
+
+@pytest.mark.parametrize("query", ["color=Nope", "interp=Nope", "mode=Nope"])
+def test_parse_path_unknown_options(query):
+    with pytest.raises(TileError) as error:
+        parse("/z**2%2Bc/0/0/0.png?" + query)
+    assert error.value.status == 400
+
+
+def test_tile_bounds():
+    assert tile_bounds(0, 0, 0) == (fractal_tileserver.WORLD_X0, fractal_tileserver.WORLD_X0 + fractal_tileserver.WORLD_SIZE,
+                                    fractal_tileserver.WORLD_Y0 - fractal_tileserver.WORLD_SIZE, fractal_tileserver.WORLD_Y0)
+    #neighbouring tiles share their edges, and y counts downwards.
+    xmin, xmax, ymin, ymax = tile_bounds(3, 2, 5)
+    assert tile_bounds(3, 3, 5)[0] == xmax
+    assert tile_bounds(3, 2, 6)[3] == ymin
+    assert xmax - xmin == ymax - ymin == fractal_tileserver.WORLD_SIZE/8
+
+
+def test_cache_evicts_by_size():
+    cache = TileCache(100)
+    cache.put("a", b"x"*40)
+    cache.put("b", b"x"*40)
+    assert cache.get("a") is not None
+    #"b" is now the least recently used, and has to go to make room.
+    cache.put("c", b"x"*40)
+    assert cache.get("b") is None
+    assert cache.get("a") is not None and cache.get("c") is not None
+    assert cache.size == 80
+
+def test_cache_replace_and_oversized():
+    cache = TileCache(100)
+    cache.put("a", b"x"*40)
+    cache.put("a", b"x"*60)
+    assert cache.size == 60
+    cache.put("b", b"x"*150)
+    assert len(cache.tiles) == 0 and cache.size == 0